@@ -0,0 +1,275 @@
+# File: anomaly.py
+
+import json
+import math
+import sqlite3
+from dataclasses import dataclass, field
+from typing import List, Optional
+import numpy as np
+from models import Anomaly, Transaction
+
+ALPHA = 0.1
+Z_THRESHOLD = 3.0
+MIN_HISTORY = 5
+SKETCH_BASE = 1.2
+SKETCH_BUCKETS = 128
+BLOCK_SIZE = 64
+
+def _bucket(amount: float) -> int:
+    """Log-scale bucket of an amount; each bucket spans a factor of SKETCH_BASE starting at one cent."""
+    if amount <= 0.01:
+        return 0
+    return min(int(math.log(amount * 100) / math.log(SKETCH_BASE)), SKETCH_BUCKETS - 1)
+
+def _amount_detail(amount: float, mean: float, p99: float) -> str:
+    return f"${amount:.2f} vs typical ${mean:.2f} (p99 ${p99:.2f})"
+
+@dataclass
+class CategoryStats:
+    """Streaming statistics for one expense category.
+
+    Amounts feed an exponentially weighted mean/variance and a log-bucket
+    quantile sketch; daily totals feed a second EWMA so spending spikes can
+    be spotted. Every update is O(1).
+    """
+    count: int = 0
+    mean: float = 0.0
+    var: float = 0.0
+    sketch: List[int] = field(default_factory=lambda: [0] * SKETCH_BUCKETS)
+    day: Optional[str] = None
+    day_total: float = 0.0
+    day_count: int = 0
+    day_mean: float = 0.0
+    day_var: float = 0.0
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile of the amounts seen so far (upper edge of its bucket)."""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.sketch):
+            seen += n
+            if n and seen >= target:
+                return SKETCH_BASE ** (i + 1) / 100
+        return 0.0
+
+    def _fold_day(self):
+        if self.day_count == 0:
+            self.day_mean, self.day_var = self.day_total, 0.0
+        else:
+            diff = self.day_total - self.day_mean
+            self.day_mean += ALPHA * diff
+            self.day_var = (1 - ALPHA) * (self.day_var + ALPHA * diff * diff)
+        self.day_count += 1
+
+    def observe(self, amount: float, day: str) -> List[Anomaly]:
+        """Fold one expense into the statistics and return the anomalies it raises."""
+        anomalies = []
+
+        if self.count >= MIN_HISTORY and self.var > 0:
+            z = (amount - self.mean) / math.sqrt(self.var)
+            if z > Z_THRESHOLD:
+                anomalies.append(Anomaly(
+                    kind='amount',
+                    score=z,
+                    detail=_amount_detail(amount, self.mean, self.quantile(0.99))
+                ))
+
+        if self.count == 0:
+            self.mean = amount
+        else:
+            diff = amount - self.mean
+            self.mean += ALPHA * diff
+            self.var = (1 - ALPHA) * (self.var + ALPHA * diff * diff)
+        self.count += 1
+        self.sketch[_bucket(amount)] += 1
+
+        # Daily totals only move forward; back-dated expenses update the amount
+        # statistics above but leave the daily series alone.
+        if self.day is None or day > self.day:
+            if self.day is not None:
+                self._fold_day()
+            self.day, self.day_total = day, 0.0
+        if day == self.day:
+            previous = self.day_total
+            self.day_total += amount
+            if self.day_count >= MIN_HISTORY and self.day_var > 0:
+                threshold = self.day_mean + Z_THRESHOLD * math.sqrt(self.day_var)
+                if previous <= threshold < self.day_total:
+                    anomalies.append(Anomaly(
+                        kind='spike',
+                        score=(self.day_total - self.day_mean) / math.sqrt(self.day_var),
+                        detail=f"${self.day_total:.2f} spent on {day} vs typical ${self.day_mean:.2f}/day"
+                    ))
+
+        return anomalies
+
+def _load_stats(cursor: sqlite3.Cursor, category: str) -> CategoryStats:
+    cursor.execute('''
+        SELECT count, mean, var, sketch, day, day_total, day_count, day_mean, day_var
+        FROM category_stats WHERE category = ?
+    ''', (category,))
+    row = cursor.fetchone()
+    if row is None:
+        return CategoryStats()
+    count, mean, var, sketch, day, day_total, day_count, day_mean, day_var = row
+    return CategoryStats(count, mean, var, json.loads(sketch), day, day_total, day_count, day_mean, day_var)
+
+def _save_stats(cursor: sqlite3.Cursor, category: str, stats: CategoryStats):
+    cursor.execute('''
+        INSERT OR REPLACE INTO category_stats
+            (category, count, mean, var, sketch, day, day_total, day_count, day_mean, day_var)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (category, stats.count, stats.mean, stats.var, json.dumps(stats.sketch), stats.day,
+          stats.day_total, stats.day_count, stats.day_mean, stats.day_var))
+
+def _save_anomalies(cursor: sqlite3.Cursor, anomalies: List[Anomaly]):
+    cursor.executemany(
+        'INSERT INTO anomalies (transaction_id, kind, score, detail) VALUES (?, ?, ?, ?)',
+        [(a.transaction_id, a.kind, a.score, a.detail) for a in anomalies]
+    )
+
+def create_tables(conn: sqlite3.Connection):
+    """Create the statistics and anomaly tables, backfilling them on first use."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'category_stats'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS category_stats (
+            category TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            var REAL NOT NULL,
+            sketch TEXT NOT NULL,
+            day TEXT,
+            day_total REAL NOT NULL,
+            day_count INTEGER NOT NULL,
+            day_mean REAL NOT NULL,
+            day_var REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS anomalies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            score REAL NOT NULL,
+            detail TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_anomalies_transaction ON anomalies (transaction_id)')
+    if not exists:
+        backfill(conn)
+
+def record_transaction(cursor: sqlite3.Cursor, transaction: Transaction) -> List[Anomaly]:
+    """Update the category's statistics with a newly stored expense and persist its anomalies."""
+    category = transaction.category.value
+    stats = _load_stats(cursor, category)
+    anomalies = stats.observe(float(transaction.amount), transaction.date.date().isoformat())
+    _save_stats(cursor, category, stats)
+    for anomaly in anomalies:
+        anomaly.transaction_id = transaction.id
+    _save_anomalies(cursor, anomalies)
+    return anomalies
+
+def _linear_recurrence(a: float, u: np.ndarray) -> np.ndarray:
+    """Solve y[t] = a * y[t-1] + u[t] with y[-1] = 0.
+
+    Works in blocks so the a**-k scaling used to turn the recurrence into a
+    cumulative sum stays well inside float64 range.
+    """
+    y = np.empty_like(u)
+    carry = 0.0
+    for start in range(0, len(u), BLOCK_SIZE):
+        block = u[start:start + BLOCK_SIZE]
+        powers = a ** np.arange(len(block))
+        y[start:start + len(block)] = powers * (a * carry + np.cumsum(block / powers))
+        carry = y[start + len(block) - 1]
+    return y
+
+def _ewma(x: np.ndarray):
+    """EWMA mean and variance after each observation, matching CategoryStats.observe."""
+    u = ALPHA * x
+    u[0] = x[0]
+    mean = _linear_recurrence(1 - ALPHA, u)
+    diff = np.empty_like(x)
+    diff[0] = 0.0
+    diff[1:] = x[1:] - mean[:-1]
+    var = _linear_recurrence(1 - ALPHA, (1 - ALPHA) * ALPHA * diff ** 2)
+    return mean, var, diff
+
+def backfill(conn: sqlite3.Connection) -> int:
+    """Rebuild every category's statistics and the anomaly log from the full history.
+
+    Each category is replayed as whole arrays rather than row by row.
+    Returns the number of anomalies found.
+    """
+    conn.execute('DELETE FROM category_stats')
+    conn.execute('DELETE FROM anomalies')
+    rows = conn.execute('''
+        SELECT id, category, amount, date FROM transactions
+        WHERE transaction_type = 'expense' ORDER BY date, id
+    ''').fetchall()
+    if not rows:
+        return 0
+
+    ids = np.array([r[0] for r in rows])
+    categories = np.array([r[1] for r in rows])
+    amounts = np.array([float(r[2]) for r in rows])
+    days = np.array([r[3][:10] for r in rows])
+    anomalies: List[Anomaly] = []
+
+    for category in np.unique(categories):
+        mask = categories == category
+        x, cat_ids, cat_days = amounts[mask], ids[mask], days[mask]
+        mean, var, diff = _ewma(x)
+        count = len(x)
+
+        # Amount outliers, each judged against the statistics before it.
+        prior_std = np.sqrt(np.concatenate(([0.0], var[:-1])))
+        history = np.arange(count)
+        buckets = np.array([_bucket(a) for a in x])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(prior_std > 0, diff / prior_std, 0.0)
+        for i in np.nonzero((history >= MIN_HISTORY) & (prior_std > 0) & (z > Z_THRESHOLD))[0]:
+            prior = CategoryStats(count=int(i), sketch=np.bincount(buckets[:i], minlength=SKETCH_BUCKETS).tolist())
+            anomalies.append(Anomaly(
+                kind='amount', score=float(z[i]), transaction_id=int(cat_ids[i]),
+                detail=_amount_detail(x[i], mean[i - 1], prior.quantile(0.99))
+            ))
+
+        # Daily spikes: running total within each day against the EWMA of completed days.
+        unique_days, day_index = np.unique(cat_days, return_inverse=True)
+        day_totals = np.bincount(day_index, weights=x)
+        running = np.cumsum(x)
+        day_start = np.concatenate(([0.0], np.cumsum(day_totals)))[day_index]
+        running_day = running - day_start
+        previous_day = running_day - x
+        day_mean, day_var, _ = _ewma(day_totals)
+        folded = day_index >= 1
+        ref_mean = np.where(folded, day_mean[np.maximum(day_index - 1, 0)], 0.0)
+        ref_std = np.where(folded, np.sqrt(day_var[np.maximum(day_index - 1, 0)]), 0.0)
+        threshold = ref_mean + Z_THRESHOLD * ref_std
+        spikes = (day_index >= MIN_HISTORY) & (ref_std > 0) & (previous_day <= threshold) & (running_day > threshold)
+        for i in np.nonzero(spikes)[0]:
+            anomalies.append(Anomaly(
+                kind='spike', score=float((running_day[i] - ref_mean[i]) / ref_std[i]),
+                transaction_id=int(cat_ids[i]),
+                detail=f"${running_day[i]:.2f} spent on {cat_days[i]} vs typical ${ref_mean[i]:.2f}/day"
+            ))
+
+        folded_days = len(unique_days) - 1
+        stats = CategoryStats(
+            count=count,
+            mean=float(mean[-1]),
+            var=float(var[-1]),
+            sketch=np.bincount(buckets, minlength=SKETCH_BUCKETS).tolist(),
+            day=str(unique_days[-1]),
+            day_total=float(day_totals[-1]),
+            day_count=folded_days,
+            day_mean=float(day_mean[folded_days - 1]) if folded_days else 0.0,
+            day_var=float(day_var[folded_days - 1]) if folded_days else 0.0
+        )
+        _save_stats(conn.cursor(), str(category), stats)
+
+    _save_anomalies(conn.cursor(), anomalies)
+    return len(anomalies)
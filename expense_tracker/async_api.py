@@ -0,0 +1,143 @@
+# File: async_api.py
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, List, Optional, Tuple, Union
+from models import Anomaly, Transaction, TransactionType, Category
+from expense_tracker import ExpenseTracker
+from budget import BudgetEngine, CategoryBudget
+from llm_processor import LLMProcessor
+
+DEFAULT_TIMEOUT = 30.0
+
+class SheetSyncError(Exception):
+    """A transaction was saved locally but could not be pushed to Google Sheets."""
+
+    def __init__(self, transaction_id: int, reason: str):
+        super().__init__(f"Transaction {transaction_id} was saved, but syncing it to Google Sheets failed: {reason}")
+        self.transaction_id = transaction_id
+
+class AsyncExpenseTracker:
+    """Asyncio front end for ExpenseTracker.
+
+    All SQLite work runs on one dedicated thread, so it never blocks the event
+    loop and never races itself; Google Sheets requests run on a separate pool
+    with a timeout so a slow network can't hold up local storage.
+    """
+
+    def __init__(self, tracker: ExpenseTracker, timeout: float = DEFAULT_TIMEOUT):
+        self.tracker = tracker
+        self.timeout = timeout
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self._net_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sheets')
+
+    async def _db(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, functools.partial(func, *args, **kwargs))
+
+    async def _net(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._net_executor, functools.partial(func, *args, **kwargs))
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def add_transaction(self, transaction: Transaction) -> int:
+        """Store a transaction, then push it to Google Sheets if it was new and sync is enabled.
+
+        The row is committed before the sheet is touched, so a Sheets failure
+        raises SheetSyncError rather than suggesting the add be retried.
+        """
+        inserted = await self._db(self.tracker.store_transaction, transaction)
+        if inserted and self.tracker.sheets_sync:
+            balance = await self._db(self.tracker.get_transaction_balance, transaction.id)
+            try:
+                await self._net(self.tracker.sheets_sync.sync_transaction, transaction, balance)
+            except asyncio.TimeoutError:
+                raise SheetSyncError(transaction.id, "the request timed out")
+            except Exception as e:
+                raise SheetSyncError(transaction.id, str(e))
+        return transaction.id
+
+    async def get_balance(self, as_of: Optional[Union[date, datetime]] = None) -> Decimal:
+        return await self._db(self.tracker.get_balance, as_of=as_of)
+
+    async def get_transactions(self) -> List[Transaction]:
+        return await self._db(self.tracker.get_transactions)
+
+    async def get_transactions_in_date_range(self, start_date: datetime, end_date: datetime) -> List[Transaction]:
+        return await self._db(self.tracker.get_transactions_in_date_range, start_date, end_date)
+
+    async def set_budget(self, category: Category, monthly_limit: Optional[Decimal]):
+        await self._db(self.tracker.set_budget, category, monthly_limit)
+
+    async def budget_report(self, engine: BudgetEngine) -> List[CategoryBudget]:
+        return await self._db(engine.report)
+
+    async def get_anomalies(self) -> List[Tuple[Anomaly, Transaction]]:
+        return await self._db(self.tracker.get_anomalies)
+
+    async def rebuild_anomaly_stats(self) -> int:
+        return await self._db(self.tracker.rebuild_anomaly_stats)
+
+    async def find_duplicates(self) -> List[List[Transaction]]:
+        return await self._db(self.tracker.find_duplicates)
+
+    async def delete_transactions(self, transaction_ids: List[int]) -> int:
+        return await self._db(self.tracker.delete_transactions, transaction_ids)
+
+    async def rebuild_sheet(self, resume: bool = False,
+                            progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Rewrite the Google Sheet from the database, with a timeout on every chunk's requests.
+
+        A timed-out chunk leaves the checkpoint in place, so the rebuild can
+        be resumed.
+        """
+        if not self.tracker.sheets_sync:
+            raise RuntimeError("Google Sheets sync is not configured")
+        rows = await self._db(self.tracker.get_running_balances)
+        steps = self.tracker.sheets_sync.rebuild_steps(rows, resume=resume)
+        written = 0
+        while True:
+            step = await self._net(next, steps, None)
+            if step is None:
+                return written
+            written, total = step
+            if progress:
+                progress(written, total)
+
+    def close(self):
+        self._db_executor.shutdown(wait=True)
+        self._net_executor.shutdown(wait=True)
+
+class AsyncLLMProcessor:
+    """Asyncio front end for LLMProcessor; each Mistral call runs off the loop with a timeout."""
+
+    def __init__(self, llm: LLMProcessor, timeout: float = DEFAULT_TIMEOUT):
+        self.llm = llm
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='llm')
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args))
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def process_transaction_input(self, text: str) -> Optional[Transaction]:
+        return await self._call(self.llm.process_transaction_input, text)
+
+    async def suggest_category(self, description: str, transaction_type: TransactionType) -> Optional[Category]:
+        return await self._call(self.llm.suggest_category, description, transaction_type)
+
+    async def get_insights(self, transactions: List[Transaction]) -> str:
+        return await self._call(self.llm.get_insights, transactions)
+
+    async def get_budget_recommendation(self, report) -> str:
+        return await self._call(self.llm.get_budget_recommendation, report)
+
+    async def answer_question(self, question: str, transactions: List[Transaction]) -> str:
+        return await self._call(self.llm.answer_question, question, transactions)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,87 @@
+# File: budget.py
+
+import calendar
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+import numpy as np
+from models import Category
+from expense_tracker import ExpenseTracker
+
+HISTORY_MONTHS = 6
+
+@dataclass
+class CategoryBudget:
+    category: Category
+    baseline: float
+    trend: float
+    spent: float
+    burn_rate: float
+    projected: float
+    limit: Optional[Decimal] = None
+
+    @property
+    def over_budget(self) -> bool:
+        return self.limit is not None and self.projected > float(self.limit)
+
+def _month_key(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
+def _previous_months(today: date, count: int) -> List[str]:
+    """Return the `count` complete months before `today`'s month, oldest first."""
+    months = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+        months.append(_month_key(year, month))
+    return months[::-1]
+
+class BudgetEngine:
+    """Deterministic budget figures computed from the aggregated monthly spending."""
+
+    def __init__(self, tracker: ExpenseTracker, history_months: int = HISTORY_MONTHS):
+        self.tracker = tracker
+        self.history_months = history_months
+
+    def report(self, today: Optional[date] = None) -> List[CategoryBudget]:
+        """Compute every category's baseline, trend, burn rate and month-end projection.
+
+        baseline is the average of the last complete months, trend the
+        least-squares change per month over the same window.
+        """
+        today = today or date.today()
+        history = _previous_months(today, self.history_months)
+        current = _month_key(today.year, today.month)
+        columns = {month: i for i, month in enumerate(history + [current])}
+        categories = list(Category)
+        rows = {category: i for i, category in enumerate(categories)}
+
+        spending = np.zeros((len(categories), len(columns)))
+        for month, category, spent in self.tracker.get_monthly_spending():
+            if month in columns:
+                spending[rows[category], columns[month]] = float(spent)
+
+        past, month_to_date = spending[:, :-1], spending[:, -1]
+        baseline = past.mean(axis=1)
+        x = np.arange(len(history)) - (len(history) - 1) / 2
+        trend = (past - baseline[:, None]) @ x / (x @ x) if len(history) > 1 else np.zeros(len(categories))
+        burn_rate = month_to_date / today.day
+        projected = burn_rate * calendar.monthrange(today.year, today.month)[1]
+
+        budgets = self.tracker.get_budgets()
+        return [
+            CategoryBudget(
+                category=category,
+                baseline=float(baseline[i]),
+                trend=float(trend[i]),
+                spent=float(month_to_date[i]),
+                burn_rate=float(burn_rate[i]),
+                projected=float(projected[i]),
+                limit=budgets.get(category)
+            )
+            for i, category in enumerate(categories)
+            if baseline[i] or month_to_date[i] or category in budgets
+        ]
@@ -0,0 +1,178 @@
+# File: category_classifier.py
+
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from typing import List, Optional, Tuple
+import numpy as np
+from models import Transaction, TransactionType, Category
+from expense_tracker import normalize_description
+
+N_FEATURES = 2 ** 14
+NGRAM_SIZES = (3, 4)
+CONFIDENCE_THRESHOLD = 0.2
+
+CATEGORIES = list(Category)
+CATEGORY_INDEX = {c: i for i, c in enumerate(CATEGORIES)}
+
+def model_path(db_path: str) -> str:
+    """Where the model trained on `db_path` is saved: next to the database, named after it."""
+    return os.path.splitext(db_path)[0] + '.category_model.npz'
+
+def _feature_ids(description: str, transaction_type: TransactionType) -> np.ndarray:
+    """Hash the character n-grams of a description (plus its type) into feature ids."""
+    text = f" {normalize_description(description)} "
+    grams = [text[i:i + n] for n in NGRAM_SIZES for i in range(len(text) - n + 1)]
+    grams.append(f"__type_{transaction_type.value}")
+    return np.array([zlib.crc32(g.encode('utf-8')) % N_FEATURES for g in grams], dtype=np.int64)
+
+class CategoryClassifier:
+    """Nearest-centroid TF-IDF classifier over hashed character n-grams.
+
+    Each category keeps the sum of its training vectors, so learning a new
+    transaction is a single row update and the model never has to be refit.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self.term_sums = np.zeros((len(CATEGORIES), N_FEATURES), dtype=np.float32)
+        self.doc_freq = np.zeros(N_FEATURES, dtype=np.float32)
+        self.n_docs = 0
+        self.last_id = 0
+        self._centroids = None
+
+    def _vector(self, feature_ids: np.ndarray) -> np.ndarray:
+        vector = np.zeros(N_FEATURES, dtype=np.float32)
+        np.add.at(vector, feature_ids, 1.0)
+        return vector
+
+    def _learn(self, description: str, transaction_type: TransactionType, category: Category):
+        feature_ids = _feature_ids(description, transaction_type)
+        np.add.at(self.term_sums[CATEGORY_INDEX[category]], feature_ids, 1.0)
+        self.doc_freq[np.unique(feature_ids)] += 1
+        self.n_docs += 1
+        self._centroids = None
+
+    def learn(self, transaction: Transaction):
+        """Fold one labelled transaction into the model."""
+        if transaction.id and transaction.id <= self.last_id:
+            return
+        self._learn(transaction.description, transaction.transaction_type, transaction.category)
+        if transaction.id:
+            self.last_id = max(self.last_id, transaction.id)
+
+    def train_from_db(self, db_path: str) -> int:
+        """Learn every transaction added since the last training run; returns how many."""
+        with sqlite3.connect(db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, transaction_type, category, description
+                FROM transactions WHERE id > ? ORDER BY id
+            ''', (self.last_id,))
+            rows = cursor.fetchall()
+
+        for transaction_id, transaction_type, category, description in rows:
+            self._learn(description, TransactionType(transaction_type), Category(category))
+            self.last_id = transaction_id
+        return len(rows)
+
+    def _idf(self) -> np.ndarray:
+        return np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1
+
+    def _get_centroids(self) -> np.ndarray:
+        if self._centroids is None:
+            weighted = self.term_sums * self._idf()
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            self._centroids = weighted / np.where(norms == 0, 1, norms)
+        return self._centroids
+
+    def suggest(self, description: str, transaction_type: TransactionType) -> Tuple[Optional[Category], float]:
+        """Return the most likely category and its cosine similarity score."""
+        if self.n_docs == 0:
+            return None, 0.0
+        feature_ids = _feature_ids(description, transaction_type)
+        idf = self._idf()
+        query = self._vector(feature_ids) * idf
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None, 0.0
+        # Only the query's non-zero columns contribute to the dot products.
+        columns = np.unique(feature_ids)
+        scores = self._get_centroids()[:, columns] @ (query[columns] / norm)
+        best = int(np.argmax(scores))
+        return CATEGORIES[best], float(scores[best])
+
+    def is_confident(self, score: float) -> bool:
+        return score >= CONFIDENCE_THRESHOLD
+
+    def save(self, path: Optional[str] = None):
+        """Save the model, by default next to the database it was trained on."""
+        np.savez(path or model_path(self.db_path), term_sums=self.term_sums, doc_freq=self.doc_freq,
+                 n_docs=self.n_docs, last_id=self.last_id, db_path=os.path.abspath(self.db_path))
+
+    @classmethod
+    def load(cls, path: str) -> 'CategoryClassifier':
+        classifier = cls()
+        with np.load(path) as data:
+            if 'db_path' in data and data['term_sums'].shape == classifier.term_sums.shape:
+                classifier.db_path = str(data['db_path'])
+                classifier.term_sums = data['term_sums']
+                classifier.doc_freq = data['doc_freq']
+                classifier.n_docs = int(data['n_docs'])
+                classifier.last_id = int(data['last_id'])
+        return classifier
+
+    @classmethod
+    def load_or_train(cls, db_path: str, path: Optional[str] = None) -> 'CategoryClassifier':
+        """Load the saved model, catching up on any transactions added since it was saved.
+
+        A model saved for a different database (or by a version that didn't
+        record one) is discarded and retrained from scratch.
+        """
+        path = path or model_path(db_path)
+        classifier = cls.load(path) if os.path.exists(path) else None
+        if classifier is None or classifier.db_path != os.path.abspath(db_path):
+            classifier = cls(db_path)
+        if classifier.train_from_db(db_path):
+            classifier.save(path)
+        return classifier
+
+def evaluate(db_path: str, holdout: float = 0.2):
+    """Train on the oldest transactions and report accuracy and latency on the newest."""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, transaction_type, category, description FROM transactions ORDER BY id')
+        rows = cursor.fetchall()
+    if len(rows) < 2:
+        print("Not enough transactions to evaluate.")
+        return
+
+    split = int(len(rows) * (1 - holdout))
+    classifier = CategoryClassifier()
+    for _, transaction_type, category, description in rows[:split]:
+        classifier._learn(description, TransactionType(transaction_type), Category(category))
+
+    test_rows = rows[split:]
+    correct = confident = confident_correct = 0
+    latencies: List[float] = []
+    for _, transaction_type, category, description in test_rows:
+        start = time.perf_counter()
+        suggestion, score = classifier.suggest(description, TransactionType(transaction_type))
+        latencies.append(time.perf_counter() - start)
+        hit = suggestion == Category(category)
+        correct += hit
+        if classifier.is_confident(score):
+            confident += 1
+            confident_correct += hit
+
+    latencies_us = np.array(latencies) * 1e6
+    print(f"Trained on {split} transactions, tested on {len(test_rows)}")
+    print(f"Accuracy: {correct / len(test_rows):.1%}")
+    print(f"Confident suggestions: {confident / len(test_rows):.1%} "
+          f"(accuracy {confident_correct / max(confident, 1):.1%})")
+    print(f"Latency: median {np.median(latencies_us):.0f}us, p99 {np.percentile(latencies_us, 99):.0f}us")
+
+if __name__ == '__main__':
+    evaluate(sys.argv[1] if len(sys.argv) > 1 else 'expense_tracker.db')
@@ -1,28 +1,46 @@
 # File: cli.py
 
+import asyncio
 import cmd
 import dotenv
 import os
+import re
+import sqlite3
 from decimal import Decimal
+from typing import Optional
 from datetime import datetime, timedelta
 from models import Transaction, TransactionType, Category
 from expense_tracker import ExpenseTracker
 from llm_processor import LLMProcessor
+from async_api import AsyncExpenseTracker, AsyncLLMProcessor, SheetSyncError
+from category_classifier import CategoryClassifier
+from budget import BudgetEngine
+import maintenance
 
 dotenv.load_dotenv()
 api_key = os.environ["KEY"]
 
+INCOME_WORDS = re.compile(r'\b(received|earned|got paid|salary|income|refund)\b', re.IGNORECASE)
+EXPENSE_WORDS = re.compile(r'\b(spent|spend|(?<!got )paid|pay|bought|buy|cost|bill)\b', re.IGNORECASE)
+DOLLAR_AMOUNT = re.compile(r'\$(\d+(?:\.\d{1,2})?)(?![\d,.]\d)')
+FILLER_WORDS = re.compile(r'^(?:(?:on|for|at|from)\b\s*)+|\s*\btoday\b', re.IGNORECASE)
+
 class ExpenseTrackerCLI(cmd.Cmd):
     intro = '''
         Welcome to the Smart Expense Tracker!
         Available commands:
             add      - Add transaction manually
             quick    - Add transaction using natural language
-            balance  - Show current balance
+            balance  - Show current balance, or the balance on a date
             list     - List all transactions
             analyze  - Get spending insights
             ask      - Ask questions about your finances
-            budget   - Get budget recommendations
+            budget   - Show budgets and projections, set limits, or get advice
+            anomalies - Show unusual transactions
+            dedupe   - Find (and optionally remove) duplicate transactions
+            rebuild_sheet - Rewrite the Google Sheet from the database
+            backup   - Snapshot the database while it is in use
+            compact  - Reclaim free space and check database integrity
             help     - Show this help message
             quit     - Exit the program
         '''
@@ -32,34 +50,90 @@ class ExpenseTrackerCLI(cmd.Cmd):
         super().__init__()
         self.tracker = ExpenseTracker(spreadsheet_id=spreadsheet_id)
         self.llm = LLMProcessor(api_key=api_key)
+        self.async_tracker = AsyncExpenseTracker(self.tracker)
+        self.async_llm = AsyncLLMProcessor(self.llm)
+        self.loop = asyncio.new_event_loop()
+        self.classifier = CategoryClassifier.load_or_train(self.tracker.db_path)
+        self.budget = BudgetEngine(self.tracker)
+
+    def run(self, coro):
+        """Drive a command coroutine on the CLI's event loop."""
+        try:
+            return self.loop.run_until_complete(coro)
+        except asyncio.TimeoutError:
+            print("Error: the request timed out. Please try again.")
+
+    def postloop(self):
+        self.classifier.save()
+        maintenance.compact_if_needed(self.tracker.db_path)
+        self.async_tracker.close()
+        self.async_llm.close()
+        self.tracker.close()
+        self.loop.close()
+
+    async def _suggest_category(self, description: str, transaction_type: TransactionType) -> Category:
+        """Suggest a category locally, asking the LLM only when the classifier is unsure."""
+        category, score = self.classifier.suggest(description, transaction_type)
+        if category and self.classifier.is_confident(score):
+            return category
+        return await self.async_llm.suggest_category(description, transaction_type) or category or Category.OTHER
+
+    async def _add_transaction(self, transaction: Transaction) -> int:
+        try:
+            transaction_id = await self.async_tracker.add_transaction(transaction)
+        except SheetSyncError as e:
+            transaction_id = e.transaction_id
+            print(f"⚠️ {e}. Run 'rebuild_sheet' to bring the sheet up to date.")
+        self.classifier.learn(transaction)
+        for anomaly in transaction.anomalies:
+            print(f"⚠️ Unusual {anomaly.kind}: {anomaly.detail}")
+        alert = transaction.budget_alert
+        if alert:
+            print(f"⚠️ Over budget: ${alert.spent:.2f} spent on {alert.category.value} "
+                  f"in {alert.month} (limit ${alert.limit:.2f})")
+        return transaction_id
 
     def do_add(self, arg):
-        """Add a new transaction: add <amount> <type> <category> <description>
-        Example: add 50.00 expense food "Lunch at cafe" """
+        """Add a new transaction: add <amount> <type> [category] <description>
+        The category is suggested from your history when omitted.
+        Example: add 50.00 expense food "Lunch at cafe"
+        Example: add 50.00 expense "Lunch at cafe" """
         try:
             args = arg.split(maxsplit=3)
-            if len(args) != 4:
-                print("Usage: add <amount> <type> <category> <description>")
+            if len(args) < 3:
+                print("Usage: add <amount> <type> [category] <description>")
                 print("Example: add 50.00 expense food \"Lunch at cafe\"")
                 return
 
-            amount, trans_type, category, description = args
+            category_values = [c.value for c in Category]
+            if len(args) == 4 and args[2].lower() in category_values:
+                amount, trans_type, category, description = args
+                category = Category(category.lower())
+            else:
+                amount, trans_type, description = arg.split(maxsplit=2)
+                category = None
+
             transaction = Transaction(
                 amount=Decimal(amount),
                 transaction_type=TransactionType(trans_type.lower()),
-                category=Category(category.lower()),
+                category=category,
                 description=description.strip('"'),
                 date=datetime.now()
             )
-            
-            transaction_id = self.tracker.add_transaction(transaction)
-            print(f"Transaction added successfully with ID: {transaction_id}")
+            self.run(self._add(transaction))
         
-        except (ValueError, KeyError) as e:
+        except (ValueError, KeyError, ArithmeticError) as e:
             print(f"Error: {str(e)}")
             print("\nAvailable categories:", [c.value for c in Category])
             print("Transaction types:", [t.value for t in TransactionType])
 
+    async def _add(self, transaction: Transaction):
+        if transaction.category is None:
+            transaction.category = await self._suggest_category(transaction.description, transaction.transaction_type)
+            print(f"Category: {transaction.category.value}")
+        transaction_id = await self._add_transaction(transaction)
+        print(f"Transaction added successfully with ID: {transaction_id}")
+
     def do_quick(self, arg):
         """Add transaction using natural language
         Example: quick Spent $25 on lunch today
@@ -67,18 +141,69 @@ class ExpenseTrackerCLI(cmd.Cmd):
         if not arg:
             print("Please provide a description of your transaction.")
             return
-            
-        transaction = self.llm.process_transaction_input(arg)
+        self.run(self._quick(arg))
+
+    def _parse_locally(self, text: str):
+        """Build a transaction without the LLM when the input is unambiguous and the classifier is confident.
+
+        That needs exactly one $-marked amount and wording that is clearly
+        income or clearly an expense; anything else goes to the LLM.
+        """
+        amounts = DOLLAR_AMOUNT.findall(text)
+        if len(amounts) != 1:
+            return None
+        income, expense = INCOME_WORDS.search(text), EXPENSE_WORDS.search(text)
+        if bool(income) == bool(expense):
+            return None
+        transaction_type = TransactionType.INCOME if income else TransactionType.EXPENSE
+
+        # "Spent $25 on lunch today" is stored as "Lunch".
+        description = DOLLAR_AMOUNT.sub(' ', text)
+        if expense:
+            description = EXPENSE_WORDS.sub(' ', description)
+        description = FILLER_WORDS.sub('', ' '.join(description.split())).strip()
+        if not description:
+            return None
+
+        category, score = self.classifier.suggest(description, transaction_type)
+        if not category or not self.classifier.is_confident(score):
+            return None
+        return Transaction(
+            amount=Decimal(amounts[0]),
+            transaction_type=transaction_type,
+            category=category,
+            description=description[0].upper() + description[1:],
+            date=datetime.now()
+        )
+
+    async def _quick(self, arg):
+        transaction = self._parse_locally(arg)
         if transaction:
+            balance = await self.async_tracker.get_balance()
+        else:
+            # The current balance is read from SQLite while the LLM parses the input.
+            transaction, balance = await asyncio.gather(
+                self.async_llm.process_transaction_input(arg),
+                self.async_tracker.get_balance()
+            )
+            if transaction:
+                # The LLM parses amount, type and description; the user's own
+                # history still decides the category when it is confident.
+                category, score = self.classifier.suggest(transaction.description, transaction.transaction_type)
+                if category and self.classifier.is_confident(score):
+                    transaction.category = category
+        if transaction:
+            change = transaction.amount if transaction.transaction_type == TransactionType.INCOME else -transaction.amount
             print("\nInterpreted as:")
             print(f"Type: {transaction.transaction_type.value}")
             print(f"Amount: ${transaction.amount}")
             print(f"Category: {transaction.category.value}")
             print(f"Description: {transaction.description}")
+            print(f"Balance after: ${balance + change:.2f}")
             
             confirm = input("\nIs this correct? (y/n): ")
             if confirm.lower() == 'y':
-                transaction_id = self.tracker.add_transaction(transaction)
+                transaction_id = await self._add_transaction(transaction)
                 print(f"Transaction added successfully with ID: {transaction_id}")
             else:
                 print("Transaction cancelled")
@@ -87,12 +212,15 @@ class ExpenseTrackerCLI(cmd.Cmd):
 
     def do_analyze(self, arg):
         """Get insights about your spending patterns"""
-        transactions = self.tracker.get_transactions()
+        self.run(self._analyze())
+
+    async def _analyze(self):
+        transactions = await self.async_tracker.get_transactions()
         if not transactions:
             print("No transactions found to analyze.")
             return
             
-        insights = self.llm.get_insights(transactions)
+        insights = await self.async_llm.get_insights(transactions)
         print("\nFinancial Insights:")
         print("-" * 80)
         print(insights)
@@ -105,39 +233,86 @@ class ExpenseTrackerCLI(cmd.Cmd):
         if not arg:
             print("Please ask a question about your finances.")
             return
-            
-        transactions = self.tracker.get_transactions()
+        self.run(self._ask(arg))
+
+    async def _ask(self, arg):
+        transactions = await self.async_tracker.get_transactions()
         if not transactions:
             print("No transaction data available.")
             return
             
-        answer = self.llm.answer_question(arg, transactions)
+        answer = await self.async_llm.answer_question(arg, transactions)
         print("\nAnswer:")
         print("-" * 80)
         print(answer)
         print("-" * 80)
 
     def do_budget(self, arg):
-        """Get personalized budget recommendations"""
-        transactions = self.tracker.get_transactions()
-        if not transactions:
+        """Show budgets and month-end projections: budget [advice]
+        Set or clear a monthly limit: budget set <category> <amount|none>
+        Example: budget set food 400"""
+        args = arg.split()
+        if args and args[0] == 'set':
+            try:
+                category = Category(args[1].lower())
+                limit = None if args[2].lower() == 'none' else Decimal(args[2])
+            except (IndexError, ValueError, ArithmeticError):
+                print("Usage: budget set <category> <amount|none>")
+                print("Available categories:", [c.value for c in Category])
+                return
+            self.run(self._set_budget(category, limit))
+            return
+        self.run(self._budget(advice=bool(args) and args[0] == 'advice'))
+
+    async def _set_budget(self, category: Category, limit: Optional[Decimal]):
+        await self.async_tracker.set_budget(category, limit)
+        print(f"Budget for {category.value} {'cleared' if limit is None else f'set to ${limit:.2f}'}")
+
+    async def _budget(self, advice: bool):
+        report = await self.async_tracker.budget_report(self.budget)
+        if not report:
             print("No transaction history available for budget recommendations.")
             return
-            
-        recommendations = self.llm.get_budget_recommendation(transactions)
-        print("\nBudget Recommendations:")
+
+        print("\nBudget Overview:")
         print("-" * 80)
-        print(recommendations)
+        print(f"{'Category':<15}{'Baseline':>11}{'Trend':>10}{'Spent':>11}{'Per day':>10}{'Projected':>12}{'Limit':>11}")
+        for b in report:
+            limit = f"${b.limit:.2f}" if b.limit is not None else "-"
+            flag = "  ⚠️" if b.over_budget else ""
+            print(f"{b.category.value:<15}{b.baseline:>11.2f}{b.trend:>+10.2f}{b.spent:>11.2f}"
+                  f"{b.burn_rate:>10.2f}{b.projected:>12.2f}{limit:>11}{flag}")
         print("-" * 80)
+
+        if advice:
+            recommendations = await self.async_llm.get_budget_recommendation(report)
+            if recommendations:
+                print("\nBudget Recommendations:")
+                print("-" * 80)
+                print(recommendations)
+                print("-" * 80)
     
     def do_balance(self, arg):
-        """Show current balance"""
-        balance = self.tracker.get_balance()
-        print(f"Current balance: ${balance:.2f}")
+        """Show current balance, or the balance at the end of a date: balance [YYYY-MM-DD]
+        Example: balance 2025-03-31"""
+        if not arg.strip():
+            balance = self.run(self.async_tracker.get_balance())
+            if balance is not None:
+                print(f"Current balance: ${balance:.2f}")
+            return
+
+        try:
+            as_of = datetime.strptime(arg.strip(), '%Y-%m-%d').date()
+        except ValueError:
+            print("Invalid date format. Please use 'balance YYYY-MM-DD'.")
+            return
+        balance = self.run(self.async_tracker.get_balance(as_of=as_of))
+        if balance is not None:
+            print(f"Balance on {as_of}: ${balance:.2f}")
 
     def do_list(self, arg):
         """List all transactions"""
-        transactions = self.tracker.get_transactions()
+        transactions = self.run(self.async_tracker.get_transactions())
         if not transactions:
             print("No transactions found")
             return
@@ -151,8 +326,133 @@ class ExpenseTrackerCLI(cmd.Cmd):
             print(f"Category: {t.category.value}")
             print(f"Amount: ${t.amount:.2f}")
             print(f"Description: {t.description}")
+            print(f"Balance: ${t.balance:.2f}")
             print("-" * 80)
 
+    def do_anomalies(self, arg):
+        """Show recent unusual transactions: anomalies [rebuild]
+        Use 'rebuild' to recompute the statistics from the full history."""
+        self.run(self._anomalies(rebuild=arg.strip() == 'rebuild'))
+
+    async def _anomalies(self, rebuild: bool):
+        if rebuild:
+            found = await self.async_tracker.rebuild_anomaly_stats()
+            print(f"Statistics rebuilt; {found} anomalies found in history")
+
+        flagged = await self.async_tracker.get_anomalies()
+        if not flagged:
+            print("No anomalies found")
+            return
+
+        print("\nAnomalies:")
+        print("-" * 80)
+        for anomaly, t in flagged:
+            print(f"ID: {t.id} | {t.date.strftime('%Y-%m-%d %H:%M')} | {t.category.value} | "
+                  f"${t.amount:.2f} | {t.description}")
+            print(f"  {anomaly.kind} (score {anomaly.score:.1f}): {anomaly.detail}")
+        print("-" * 80)
+
+    def do_dedupe(self, arg):
+        """Find duplicate transactions: dedupe [remove [<id> ...]]
+        'remove <id> ...' deletes the listed transactions; 'remove' alone offers
+        to keep only the oldest copy of each group after confirmation."""
+        self.run(self._dedupe(arg.split()))
+
+    async def _dedupe(self, args):
+        groups = await self.async_tracker.find_duplicates()
+        if not groups:
+            print("No duplicate transactions found")
+            return
+
+        print("\nPossible Duplicates:")
+        print("-" * 80)
+        for group in groups:
+            for t in group:
+                print(f"ID: {t.id} | {t.date.strftime('%Y-%m-%d %H:%M')} | "
+                      f"{t.transaction_type.value} | {t.category.value} | ${t.amount:.2f} | {t.description}")
+            print("-" * 80)
+
+        if not args or args[0] != 'remove':
+            print("Run 'dedupe remove <id> ...' to delete specific copies, "
+                  "or 'dedupe remove' to keep only the oldest of each group.")
+            return
+
+        candidates = {t.id for group in groups for t in group}
+        if len(args) > 1:
+            try:
+                duplicate_ids = [int(i) for i in args[1:]]
+            except ValueError:
+                print("Usage: dedupe remove [<id> ...]")
+                return
+            unknown = [i for i in duplicate_ids if i not in candidates]
+            if unknown:
+                print(f"Not listed as possible duplicates: {unknown}")
+                return
+        else:
+            duplicate_ids = [t.id for group in groups for t in group[1:]]
+            # Same amount, day and description can still be two real payments,
+            # e.g. two coffees, so never delete a whole bucket unprompted.
+            confirm = input(f"\nRemove transactions {duplicate_ids}? (y/n): ")
+            if confirm.lower() != 'y':
+                print("Nothing removed")
+                return
+
+        deleted = await self.async_tracker.delete_transactions(duplicate_ids)
+        print(f"Removed {deleted} duplicate transactions")
+        if self.tracker.sheets_sync:
+            print("Run 'rebuild_sheet' to update the Google Sheet.")
+
+    def do_rebuild_sheet(self, arg):
+        """Rewrite the Google Sheet from the database: rebuild_sheet [resume]
+        Use 'resume' to continue an interrupted rebuild."""
+        if not self.tracker.sheets_sync:
+            print("Google Sheets sync is not configured.")
+            return
+
+        self.run(self._rebuild_sheet(resume=arg.strip() == 'resume'))
+
+    async def _rebuild_sheet(self, resume: bool):
+        def report(written, total):
+            print(f"Written {written}/{total} rows")
+
+        try:
+            written = await self.async_tracker.rebuild_sheet(resume=resume, progress=report)
+            print(f"Sheet rebuilt with {written} rows")
+        except Exception as e:
+            print(f"Error: {e or 'the request timed out'}")
+            print("Run 'rebuild_sheet resume' to continue from the last written chunk.")
+
+    def do_backup(self, arg):
+        """Snapshot the database into the backups folder: backup [keep]
+        Only the newest <keep> snapshots are kept (default 7)."""
+        try:
+            keep = int(arg) if arg.strip() else maintenance.BACKUP_KEEP
+        except ValueError:
+            print("Usage: backup [keep]")
+            return
+
+        def report(copied, total):
+            print(f"\rCopied {copied}/{total} pages", end="", flush=True)
+
+        try:
+            path = maintenance.backup(self.tracker.db_path, keep=keep, progress=report)
+            print(f"\nBackup written to {path}")
+        except sqlite3.Error as e:
+            print(f"\nError: {e}")
+
+    def do_compact(self, arg):
+        """Reclaim free space in the database and verify its integrity"""
+        print(f"Free space: {maintenance.fragmentation(self.tracker.db_path):.1%} of the file")
+        released = maintenance.compact(self.tracker.db_path)
+        print(f"Released {released} pages")
+        problems = maintenance.check_integrity(self.tracker.db_path)
+        if problems:
+            print("Integrity check failed:")
+            for problem in problems:
+                print(f"  {problem}")
+        else:
+            print("Integrity check passed")
+
     def do_quit(self, arg):
         """Exit the program"""
         print("Thank you for using Expense Tracker!")
@@ -171,7 +471,7 @@ class ExpenseTrackerCLI(cmd.Cmd):
             date_to = datetime.strptime(date_to_str, '%Y-%m-%d')
 
             # Fetch transactions in the specified date range
-            transactions = self.tracker.get_transactions_in_date_range(date_from, date_to)
+            transactions = self.run(self.async_tracker.get_transactions_in_date_range(date_from, date_to))
             if not transactions:
                 print("No transactions found in this date range.")
                 return
@@ -1,21 +1,103 @@
+import functools
+import hashlib
+import re
 import sqlite3
+from collections import OrderedDict
 from decimal import Decimal
-from datetime import datetime
-from typing import List, Optional  
-from models import Transaction, TransactionType, Category
+from datetime import date, datetime, time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from models import Anomaly, BudgetAlert, Transaction, TransactionType, Category
 from sheets_sync import GoogleSheetsSync
+import anomaly
+
+def normalize_description(description: Optional[str]) -> str:
+    """Lowercase a description and collapse punctuation and whitespace."""
+    return re.sub(r'[^a-z0-9]+', ' ', (description or '').lower()).strip()
+
+def transaction_fingerprint(transaction: Transaction) -> str:
+    """Content hash identifying a transaction across re-imports."""
+    key = '|'.join([
+        f"{transaction.amount:.2f}",
+        transaction.transaction_type.value,
+        transaction.category.value,
+        normalize_description(transaction.description),
+        transaction.date.isoformat(),
+        transaction.external_id or ''
+    ])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def cached_query(method):
+    """Serve repeated read calls with the same arguments from the tracker's result cache.
+
+    Cached results are shared between callers and must be treated as read-only.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        return self._cached(key, lambda: method(self, *args, **kwargs))
+    return wrapper
 
 class ExpenseTracker:
-    def __init__(self, db_path: str = "expense_tracker.db", spreadsheet_id: Optional[str] = None):
+    def __init__(self, db_path: str = "expense_tracker.db", spreadsheet_id: Optional[str] = None,
+                 cache_size: int = 128):
         self.db_path = db_path
         self.init_database()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # A long-lived connection whose PRAGMA data_version changes whenever any
+        # other connection, in this process or another, commits to the file.
+        self._version_conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.sheets_sync = None
         if spreadsheet_id:
             self.sheets_sync = GoogleSheetsSync(spreadsheet_id)
             self.sheets_sync.setup_spreadsheet()
 
+    def _data_version(self) -> int:
+        return self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _cached(self, key: tuple, compute: Callable):
+        stamp = (self._generation, self._data_version())
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return entry[1]
+
+        self.cache_misses += 1
+        result = compute()
+        self._cache[key] = (stamp, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def invalidate_cache(self):
+        """Mark every cached query result as stale."""
+        self._generation += 1
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Return hit/miss counts and the hit rate of the query cache."""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+            'size': len(self._cache)
+        }
+
+    def close(self):
+        """Close the connection kept open for cache validation."""
+        self._version_conn.close()
+
     def init_database(self):
         with sqlite3.connect(self.db_path) as conn:
+            # Both settings persist in the file. WAL lets backups read while
+            # others write; auto_vacuum only applies to newly created databases.
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('PRAGMA journal_mode = WAL')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS transactions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -23,83 +105,430 @@ class ExpenseTracker:
                     transaction_type TEXT NOT NULL,
                     category TEXT NOT NULL,
                     description TEXT,
-                    date TIMESTAMP NOT NULL
+                    date TIMESTAMP NOT NULL,
+                    balance DECIMAL,
+                    external_id TEXT,
+                    fingerprint TEXT
                 )
             ''')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(transactions)')]
+            if 'balance' not in columns:
+                conn.execute('ALTER TABLE transactions ADD COLUMN balance DECIMAL')
+                self._recompute_balances(conn)
+            if 'fingerprint' not in columns:
+                conn.execute('ALTER TABLE transactions ADD COLUMN external_id TEXT')
+                conn.execute('ALTER TABLE transactions ADD COLUMN fingerprint TEXT')
+                self._backfill_fingerprints(conn)
+            conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint
+                ON transactions (fingerprint)
+            ''')
+            # Checkpoint index: the balance as of any date is one seek on (date, id).
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transactions_date_balance
+                ON transactions (date, id, balance)
+            ''')
+
+            # Expense totals per (month, category), kept current on every write
+            # so budget checks never have to scan the ledger.
+            has_totals = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'monthly_spending'"
+            ).fetchone()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS monthly_spending (
+                    month TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    spent DECIMAL NOT NULL,
+                    PRIMARY KEY (month, category)
+                ) WITHOUT ROWID
+            ''')
+            if not has_totals:
+                conn.execute('''
+                    INSERT INTO monthly_spending (month, category, spent)
+                    SELECT substr(date, 1, 7), category, SUM(amount)
+                    FROM transactions WHERE transaction_type = 'expense'
+                    GROUP BY substr(date, 1, 7), category
+                ''')
+            anomaly.create_tables(conn)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS budgets (
+                    category TEXT PRIMARY KEY,
+                    monthly_limit DECIMAL NOT NULL
+                )
+            ''')
+
+    def _recompute_balances(self, conn: sqlite3.Connection, since: str = ''):
+        """Store the running balance of every row dated on or after `since` in one ordered pass.
+
+        Amounts are stored as REAL, so balances are rounded to cents here and
+        in store_transaction to keep both paths exact and identical.
+        """
+        conn.execute('''
+            UPDATE transactions SET balance = running.balance
+            FROM (
+                SELECT id, ROUND(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END)
+                    OVER (ORDER BY date, id ROWS UNBOUNDED PRECEDING), 2) AS balance
+                FROM transactions
+            ) AS running
+            WHERE transactions.id = running.id AND transactions.date >= ?
+        ''', (since,))
+
+    def _backfill_fingerprints(self, conn: sqlite3.Connection):
+        """Fingerprint existing rows; only the first copy of a duplicate gets one, so `dedupe` can still find the rest."""
+        seen = set()
+        updates = []
+        cursor = conn.execute('''
+            SELECT id, amount, transaction_type, category, description, date
+            FROM transactions ORDER BY id
+        ''')
+        for transaction_id, amount, transaction_type, category, description, date_str in cursor.fetchall():
+            fingerprint = transaction_fingerprint(Transaction(
+                amount=Decimal(str(amount)),
+                transaction_type=TransactionType(transaction_type),
+                category=Category(category),
+                description=description,
+                date=datetime.fromisoformat(date_str)
+            ))
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                updates.append((fingerprint, transaction_id))
+        conn.executemany('UPDATE transactions SET fingerprint = ? WHERE id = ?', updates)
+
+    def _insert(self, cursor: sqlite3.Cursor, transaction: Transaction) -> bool:
+        """Insert a transaction unless its fingerprint already exists.
+
+        Sets transaction.id to the new or existing row and returns whether a row was written.
+        """
+        fingerprint = transaction_fingerprint(transaction)
+        cursor.execute('''
+            INSERT INTO transactions (amount, transaction_type, category, description, date, external_id, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (fingerprint) DO NOTHING
+        ''', (
+            str(transaction.amount),
+            transaction.transaction_type.value,
+            transaction.category.value,
+            transaction.description,
+            transaction.date.isoformat(),
+            transaction.external_id,
+            fingerprint
+        ))
+        if cursor.rowcount:
+            transaction.id = cursor.lastrowid
+            if transaction.transaction_type == TransactionType.EXPENSE:
+                cursor.execute('''
+                    INSERT INTO monthly_spending (month, category, spent) VALUES (?, ?, ?)
+                    ON CONFLICT (month, category) DO UPDATE SET spent = spent + excluded.spent
+                ''', (transaction.date.strftime('%Y-%m'), transaction.category.value, str(transaction.amount)))
+                transaction.anomalies = anomaly.record_transaction(cursor, transaction)
+                transaction.budget_alert = self._budget_alert(cursor, transaction)
+            return True
+        cursor.execute('SELECT id FROM transactions WHERE fingerprint = ?', (fingerprint,))
+        transaction.id = cursor.fetchone()[0]
+        return False
+
+    def _budget_alert(self, cursor: sqlite3.Cursor, transaction: Transaction) -> Optional[BudgetAlert]:
+        """Return an alert if a just-inserted expense took its category over this month's limit.
+
+        Both figures are primary-key lookups.
+        """
+        month = transaction.date.strftime('%Y-%m')
+        cursor.execute('''
+            SELECT
+                (SELECT spent FROM monthly_spending WHERE month = ? AND category = ?),
+                (SELECT monthly_limit FROM budgets WHERE category = ?)
+        ''', (month, transaction.category.value, transaction.category.value))
+        spent, limit = cursor.fetchone()
+        if limit is not None and Decimal(str(spent)) > Decimal(str(limit)):
+            return BudgetAlert(transaction.category, month, Decimal(str(spent)), Decimal(str(limit)))
+        return None
+
+    def _stored_balances(self, cursor: sqlite3.Cursor, transactions: List[Transaction]) -> List[Tuple[Transaction, Decimal]]:
+        balances = {}
+        for transaction in transactions:
+            cursor.execute('SELECT balance FROM transactions WHERE id = ?', (transaction.id,))
+            balances[transaction.id] = Decimal(str(cursor.fetchone()[0]))
+        return [(t, balances[t.id]) for t in transactions]
+
+    def store_transaction(self, transaction: Transaction) -> bool:
+        """Write a transaction to the database without syncing it anywhere.
+
+        Skips it if an identical one is already stored; transaction.id is set
+        either way. Returns whether a new row was written.
+        """
+        delta = transaction.amount if transaction.transaction_type == TransactionType.INCOME else -transaction.amount
+        date_key = transaction.date.isoformat()
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            if not self._insert(cursor, transaction):
+                return False
+            transaction_id = transaction.id
+
+            # The new row continues from the balance just before it; only the
+            # suffix of later-dated rows needs shifting when it is back-dated.
+            cursor.execute('''
+                UPDATE transactions SET balance = ROUND(COALESCE((
+                    SELECT balance FROM transactions
+                    WHERE (date, id) < (?, ?)
+                    ORDER BY date DESC, id DESC LIMIT 1
+                ), 0) + ?, 2)
+                WHERE id = ?
+            ''', (date_key, transaction_id, str(delta), transaction_id))
+            cursor.execute('''
+                UPDATE transactions SET balance = ROUND(balance + ?, 2)
+                WHERE (date, id) > (?, ?)
+            ''', (str(delta), date_key, transaction_id))
+            conn.commit()
+            self.invalidate_cache()
+            return True
 
     def add_transaction(self, transaction: Transaction) -> int:
+        """Add a transaction, skipping it if an identical one is already stored.
+
+        Returns the id of the new row, or of the existing duplicate.
+        """
+        if self.store_transaction(transaction) and self.sheets_sync:
+            balance = self.get_transaction_balance(transaction.id)
+            self.sheets_sync.sync_transaction(transaction, balance)
+        return transaction.id
+
+    def add_transactions(self, transactions: List[Transaction], sync_sheets: bool = True) -> List[int]:
+        """Add many transactions in one database transaction, skipping duplicates.
+
+        Returns the ids in input order; duplicates resolve to the stored row.
+        """
+        added = []
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            for transaction in transactions:
+                if self._insert(cursor, transaction):
+                    added.append(transaction)
+            if added:
+                self._recompute_balances(conn, since=min(t.date for t in added).isoformat())
+            conn.commit()
+            self.invalidate_cache()
+
+            if self.sheets_sync and sync_sheets and added:
+                self.sheets_sync.sync_transactions(self._stored_balances(cursor, added))
+
+        return [t.id for t in transactions]
+
+    def find_duplicates(self) -> List[List[Transaction]]:
+        """Group stored transactions that look like the same real-world payment.
+
+        Rows are bucketed by amount, type, calendar day and normalized
+        description in a single pass, so no pairwise comparison is needed.
+        """
+        buckets: Dict[tuple, List[Transaction]] = {}
+        for transaction in self.get_transactions():
+            key = (
+                f"{transaction.amount:.2f}",
+                transaction.transaction_type,
+                transaction.date.date(),
+                normalize_description(transaction.description)
+            )
+            buckets.setdefault(key, []).append(transaction)
+        return [sorted(group, key=lambda t: t.id) for group in buckets.values() if len(group) > 1]
+
+    def delete_transactions(self, transaction_ids: List[int]) -> int:
+        """Delete transactions by id and restore the running balances after them."""
+        if not transaction_ids:
+            return 0
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(transaction_ids))
+            cursor.execute(f'SELECT MIN(date) FROM transactions WHERE id IN ({placeholders})', transaction_ids)
+            since = cursor.fetchone()[0]
+            cursor.execute(f'''
+                UPDATE monthly_spending SET spent = spent - removed.total
+                FROM (
+                    SELECT substr(date, 1, 7) AS month, category, SUM(amount) AS total
+                    FROM transactions
+                    WHERE id IN ({placeholders}) AND transaction_type = 'expense'
+                    GROUP BY substr(date, 1, 7), category
+                ) AS removed
+                WHERE monthly_spending.month = removed.month AND monthly_spending.category = removed.category
+            ''', transaction_ids)
+            cursor.execute(f'DELETE FROM anomalies WHERE transaction_id IN ({placeholders})', transaction_ids)
+            cursor.execute(f'DELETE FROM transactions WHERE id IN ({placeholders})', transaction_ids)
+            deleted = cursor.rowcount
+            if since:
+                self._recompute_balances(conn, since=since)
+            conn.commit()
+            self.invalidate_cache()
+        return deleted
+
+    def set_budget(self, category: Category, monthly_limit: Optional[Decimal]):
+        """Set the monthly spending limit for a category; None removes it."""
+        with sqlite3.connect(self.db_path) as conn:
+            if monthly_limit is None:
+                conn.execute('DELETE FROM budgets WHERE category = ?', (category.value,))
+            else:
+                conn.execute('''
+                    INSERT INTO budgets (category, monthly_limit) VALUES (?, ?)
+                    ON CONFLICT (category) DO UPDATE SET monthly_limit = excluded.monthly_limit
+                ''', (category.value, str(monthly_limit)))
+            conn.commit()
+        self.invalidate_cache()
+
+    @cached_query
+    def get_budgets(self) -> Dict[Category, Decimal]:
+        """Return the monthly spending limit of every budgeted category."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT category, monthly_limit FROM budgets')
+            return {Category(category): Decimal(str(limit)) for category, limit in cursor.fetchall()}
+
+    @cached_query
+    def get_monthly_spending(self) -> List[Tuple[str, Category, Decimal]]:
+        """Return the aggregated expense total of every (month, category) pair."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT month, category, spent FROM monthly_spending ORDER BY month')
+            return [(month, Category(category), Decimal(str(spent))) for month, category, spent in cursor.fetchall()]
+
+    @cached_query
+    def get_anomalies(self, limit: int = 50) -> List[Tuple[Anomaly, Transaction]]:
+        """Return the most recent anomalies with the transactions that raised them."""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO transactions (amount, transaction_type, category, description, date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                str(transaction.amount),
-                transaction.transaction_type.value,
-                transaction.category.value,
-                transaction.description,
-                transaction.date.isoformat()
-            ))
+                SELECT a.kind, a.score, a.detail, t.id, t.amount, t.transaction_type, t.category, t.description, t.date
+                FROM anomalies a JOIN transactions t ON t.id = a.transaction_id
+                ORDER BY t.date DESC, t.id DESC
+                LIMIT ?
+            ''', (limit,))
+            return [
+                (
+                    Anomaly(kind=kind, score=score, detail=detail, transaction_id=transaction_id),
+                    Transaction(
+                        id=transaction_id,
+                        amount=Decimal(str(amount)),
+                        transaction_type=TransactionType(transaction_type),
+                        category=Category(category),
+                        description=description,
+                        date=datetime.fromisoformat(date_str)
+                    )
+                )
+                for kind, score, detail, transaction_id, amount, transaction_type, category, description, date_str
+                in cursor.fetchall()
+            ]
+
+    def rebuild_anomaly_stats(self) -> int:
+        """Recompute the anomaly statistics and log from the whole history in one pass."""
+        with sqlite3.connect(self.db_path) as conn:
+            found = anomaly.backfill(conn)
             conn.commit()
-            transaction_id = cursor.lastrowid
-            
-            if self.sheets_sync:
-                balance = self.get_balance()
-                self.sheets_sync.sync_transaction(transaction, balance)
-            
-            return transaction_id
+        self.invalidate_cache()
+        return found
+
+    def get_transaction_balance(self, transaction_id: int) -> Decimal:
+        """Return the stored running balance of a single transaction."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT balance FROM transactions WHERE id = ?', (transaction_id,))
+            return Decimal(str(cursor.fetchone()[0]))
+
+    @cached_query
+    def get_balance(self, as_of: Optional[Union[date, datetime]] = None) -> Decimal:
+        """Return the current balance, or the balance at the end of `as_of`."""
+        query = 'SELECT balance FROM transactions'
+        params = []
+        if as_of is not None:
+            if not isinstance(as_of, datetime):
+                as_of = datetime.combine(as_of, time.max)
+            query += ' WHERE date <= ?'
+            params.append(as_of.isoformat())
+        query += ' ORDER BY date DESC, id DESC LIMIT 1'
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            return Decimal(str(row[0])) if row else Decimal(0)
 
-    def get_balance(self) -> Decimal:
+    @cached_query
+    def get_running_balances(self) -> List[Tuple[Transaction, Decimal]]:
+        """Retrieve all transactions in date order with the balance as of each row."""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT COALESCE(SUM(
-                    CASE WHEN transaction_type = 'income' 
-                    THEN amount ELSE -amount END
-                ), 0) FROM transactions
+                SELECT id, amount, transaction_type, category, description, date, balance
+                FROM transactions
+                ORDER BY date, id
             ''')
-            return Decimal(cursor.fetchone()[0])
 
+            rows = []
+            for row in cursor.fetchall():
+                transaction_id, amount, transaction_type, category, description, date, balance = row
+                transaction = Transaction(
+                    id=transaction_id,
+                    amount=Decimal(str(amount)),
+                    transaction_type=TransactionType(transaction_type),
+                    category=Category(category),
+                    description=description,
+                    date=datetime.fromisoformat(date)
+                )
+                rows.append((transaction, Decimal(str(balance))))
+
+        return rows
+
+    def rebuild_sheet(self, resume: bool = False,
+                      progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Rewrite the whole spreadsheet from the database in one ordered pass."""
+        if not self.sheets_sync:
+            raise RuntimeError("Google Sheets sync is not configured")
+        return self.sheets_sync.rebuild(self.get_running_balances(), resume=resume, progress=progress)
+
+    @cached_query
     def get_transactions(self) -> List[Transaction]:
         """Retrieve all transactions from the database."""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT amount, transaction_type, category, description, date FROM transactions')
+            cursor.execute('''
+                SELECT id, amount, transaction_type, category, description, date, balance, external_id
+                FROM transactions
+                ORDER BY date, id
+            ''')
             
             transactions = []
             for row in cursor.fetchall():
-                amount, transaction_type, category, description, date = row
+                transaction_id, amount, transaction_type, category, description, date, balance, external_id = row
                 transaction = Transaction(
-                    amount=Decimal(amount),
+                    id=transaction_id,
+                    amount=Decimal(str(amount)),
                     transaction_type=TransactionType(transaction_type),
                     category=Category(category),
                     description=description,
-                    date=datetime.fromisoformat(date)
+                    date=datetime.fromisoformat(date),
+                    balance=Decimal(str(balance)),
+                    external_id=external_id
                 )
                 transactions.append(transaction)
         
         return transactions
     
+    @cached_query
     def get_transactions_in_date_range(self, start_date: datetime, end_date: datetime) -> List[Transaction]:
-    """Retrieve transactions within a specific date range."""
-    with sqlite3.connect(self.db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT amount, transaction_type, category, description, date 
-            FROM transactions 
-            WHERE date BETWEEN ? AND ?
-        ''', (start_date.isoformat(), end_date.isoformat()))
-
-        transactions = []
-        for row in cursor.fetchall():
-            amount, transaction_type, category, description, date = row
-            transaction = Transaction(
-                amount=Decimal(amount),
-                transaction_type=TransactionType(transaction_type),
-                category=Category(category),
-                description=description,
-                date=datetime.fromisoformat(date)
-            )
-            transactions.append(transaction)
+        """Retrieve transactions within a specific date range."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT amount, transaction_type, category, description, date 
+                FROM transactions 
+                WHERE date BETWEEN ? AND ?
+            ''', (start_date.isoformat(), end_date.isoformat()))
+
+            transactions = []
+            for row in cursor.fetchall():
+                amount, transaction_type, category, description, date = row
+                transaction = Transaction(
+                    amount=Decimal(str(amount)),
+                    transaction_type=TransactionType(transaction_type),
+                    category=Category(category),
+                    description=description,
+                    date=datetime.fromisoformat(date)
+                )
+                transactions.append(transaction)
 
-    return transactions
+        return transactions
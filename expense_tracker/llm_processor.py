@@ -49,6 +49,25 @@ class LLMProcessor:
 
 
 
+    def suggest_category(self, description: str, transaction_type: TransactionType) -> Optional[Category]:
+        """Ask the LLM for the category of a transaction description."""
+        prompt = f"""
+        Pick the category of this {transaction_type.value}: "{description}"
+
+        Reply with exactly one of {[c.value for c in Category]} and nothing else.
+        """
+
+        try:
+            response = self.client.chat(
+                model="mistral-medium",
+                messages=[{"role": "user", "content": prompt}]
+            )
+
+            return Category(response.choices[0].message.content.strip().strip('"').lower())
+        except Exception as e:
+            print(f"❌ Error suggesting category: {e}")
+            return None
+
     def get_insights(self, transactions: List[Transaction]) -> str:
         """Generate financial insights based on spending patterns."""
         trans_summary = "\n".join([
@@ -79,6 +98,32 @@ class LLMProcessor:
         except Exception as e:
             return f"❌ Error generating insights: {e}"
 
+    def get_budget_recommendation(self, report) -> str:
+        """Write budget advice from the figures computed by BudgetEngine."""
+        figures = "\n".join([
+            f"- {b.category.value}: baseline ${b.baseline:.2f}/month, trend {b.trend:+.2f}/month, "
+            f"spent ${b.spent:.2f} so far, projected ${b.projected:.2f}"
+            + (f", limit ${b.limit:.2f}" if b.limit is not None else "")
+            for b in report
+        ])
+
+        prompt = f"""
+        Here are my spending figures per category for this month:
+        {figures}
+
+        Write short, actionable budget recommendations based only on these numbers.
+        """
+
+        try:
+            response = self.client.chat(
+                model="mistral-medium",
+                messages=[{"role": "user", "content": prompt}]
+            )
+
+            return response.choices[0].message["content"]
+        except Exception as e:
+            return f"❌ Error generating budget recommendations: {e}"
+
     def answer_question(self, question: str, transactions: List[Transaction]) -> str:
         """Answer financial questions using transaction data."""
         trans_summary = {}
@@ -10,32 +10,41 @@ def main():
     # Initialize the tracker
     tracker = ExpenseTracker(spreadsheet_id=SPREADSHEET_ID)
     
-    # Example transactions
+    # Example transactions; fixed dates and ids make re-runs no-ops
     transactions = [
         Transaction(
             amount=Decimal("1000.00"),
             transaction_type=TransactionType.INCOME,
             category=Category.SALARY,
             description="Monthly salary",
-            date=datetime.now()
+            date=datetime(2025, 1, 31, 9, 0),
+            external_id="example-salary-2025-01"
         ),
         Transaction(
             amount=Decimal("25.50"),
             transaction_type=TransactionType.EXPENSE,
             category=Category.FOOD,
             description="Lunch at cafe",
-            date=datetime.now()
+            date=datetime(2025, 1, 31, 12, 30),
+            external_id="example-lunch-2025-01-31"
         )
     ]
     
-    # Add transactions
+    # Add transactions; rows already in the database are skipped
+    for transaction_id in tracker.add_transactions(transactions):
+        print(f"Stored transaction {transaction_id}")
     for transaction in transactions:
-        transaction_id = tracker.add_transaction(transaction)
-        print(f"Added transaction {transaction_id}")
+        for anomaly in transaction.anomalies:
+            print(f"Unusual {anomaly.kind} in transaction {transaction.id}: {anomaly.detail}")
+        alert = transaction.budget_alert
+        if alert:
+            print(f"Over budget: ${alert.spent:.2f} spent on {alert.category.value} in {alert.month} "
+                  f"(limit ${alert.limit:.2f})")
     
     # Show balance
     balance = tracker.get_balance()
     print(f"Current balance: ${balance:.2f}")
+    tracker.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,206 @@
+# File: maintenance.py
+
+import glob
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+import numpy as np
+from expense_tracker import ExpenseTracker
+
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = 7
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_SLEEP = 0.005
+MAX_RESTARTS = 5
+VACUUM_STEP_PAGES = 2048
+COMPACT_THRESHOLD = 0.1
+
+class _BackupRestarted(Exception):
+    pass
+
+def check_integrity(db_path: str, quick: bool = False) -> List[str]:
+    """Run SQLite's integrity check; an empty list means the database is sound."""
+    conn = sqlite3.connect(db_path)
+    try:
+        pragma = 'quick_check' if quick else 'integrity_check'
+        problems = [row[0] for row in conn.execute(f'PRAGMA {pragma}')]
+    finally:
+        conn.close()
+    return [] if problems == ['ok'] else problems
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection, pages: int, sleep: float,
+          progress: Optional[Callable[[int, int], None]]):
+    """Copy `pages` at a time, pausing between steps so writers can get the lock.
+
+    A step restarts from scratch if another connection writes to the source;
+    after MAX_RESTARTS the copy is redone in a single step instead, which only
+    needs one read snapshot.
+    """
+    state = {'remaining': None, 'restarts': 0}
+
+    def on_step(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _BackupRestarted()
+        state['remaining'] = remaining
+        if progress:
+            progress(total - remaining, total)
+
+    try:
+        source.backup(target, pages=pages, progress=on_step, sleep=sleep)
+    except _BackupRestarted:
+        source.backup(target, pages=-1)
+
+def backup(db_path: str, backup_dir: str = BACKUP_DIR, keep: int = BACKUP_KEEP,
+           pages: int = BACKUP_STEP_PAGES, sleep: float = BACKUP_STEP_SLEEP,
+           progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """Snapshot a live database with the online backup API and keep the newest `keep` snapshots.
+
+    The snapshot is written under a temporary name and only renamed into place
+    once it passes an integrity check, so a rotation never removes a good
+    backup in favour of a broken one.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    path = os.path.join(backup_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db")
+    partial = path + '.partial'
+
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(partial)
+    try:
+        _copy(source, target, pages, sleep, progress)
+    finally:
+        target.close()
+        source.close()
+
+    problems = check_integrity(partial)
+    if problems:
+        os.remove(partial)
+        raise sqlite3.DatabaseError(f"Backup failed integrity check: {problems[0]}")
+    os.replace(partial, path)
+
+    snapshots = sorted(glob.glob(os.path.join(backup_dir, f"{name}-*.db")))
+    for old in snapshots[:-keep] if keep > 0 else []:
+        os.remove(old)
+    return path
+
+def fragmentation(db_path: str) -> float:
+    """Fraction of the database file occupied by free pages."""
+    conn = sqlite3.connect(db_path)
+    try:
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        total = conn.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        conn.close()
+    return free / total if total else 0.0
+
+def compact(db_path: str, step_pages: int = VACUUM_STEP_PAGES, max_steps: Optional[int] = None,
+            progress: Optional[Callable[[int], None]] = None) -> int:
+    """Return free pages to the filesystem a batch at a time; returns the pages released.
+
+    Each batch is its own short write transaction. A database created before
+    incremental auto-vacuum was enabled is converted with one full VACUUM.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            before = conn.execute('PRAGMA page_count').fetchone()[0]
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            return before - conn.execute('PRAGMA page_count').fetchone()[0]
+
+        released = 0
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if free == 0:
+                break
+            # executescript steps the pragma to completion; execute() would
+            # release only a single page.
+            conn.executescript(f'PRAGMA incremental_vacuum({min(free, step_pages)});')
+            released += free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            steps += 1
+            if progress:
+                progress(released)
+        return released
+    finally:
+        conn.close()
+
+def compact_if_needed(db_path: str, threshold: float = COMPACT_THRESHOLD, max_steps: int = 1) -> int:
+    """Run a bounded amount of incremental vacuum when enough of the file is free pages."""
+    conn = sqlite3.connect(db_path)
+    try:
+        incremental = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        conn.close()
+    if not incremental or fragmentation(db_path) < threshold:
+        return 0
+    return compact(db_path, max_steps=max_steps)
+
+def _build_ledger(db_path: str, size_gb: float):
+    """Fill a synthetic ledger until the file reaches roughly `size_gb`."""
+    ExpenseTracker(db_path=db_path)
+    conn = sqlite3.connect(db_path)
+    target = size_gb * 1024 ** 3
+    day = 0
+    while os.path.getsize(db_path) < target:
+        rows = [
+            (f"{random.uniform(1, 500):.2f}", 'expense', 'other',
+             'synthetic ' + os.urandom(96).hex(), datetime.fromordinal(730000 + day).isoformat(), 0)
+            for _ in range(20000)
+        ]
+        conn.executemany('''
+            INSERT INTO transactions (amount, transaction_type, category, description, date, balance)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        day += 1
+    conn.close()
+
+def benchmark(db_path: str, size_gb: float = 2.0, backup_dir: str = BACKUP_DIR):
+    """Measure backup throughput and how long a concurrent writer stalls while it runs."""
+    if not os.path.exists(db_path):
+        print(f"Building a {size_gb} GB synthetic ledger at {db_path}...")
+        _build_ledger(db_path, size_gb)
+
+    stalls = []
+    done = threading.Event()
+
+    def writer():
+        conn = sqlite3.connect(db_path, timeout=60)
+        while not done.is_set():
+            start = time.perf_counter()
+            conn.execute('''
+                INSERT INTO transactions (amount, transaction_type, category, description, date, balance)
+                VALUES ('1.00', 'expense', 'other', 'benchmark writer', ?, 0)
+            ''', (datetime.now().isoformat(),))
+            conn.commit()
+            stalls.append(time.perf_counter() - start)
+            time.sleep(0.01)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    start = time.perf_counter()
+    path = backup(db_path, backup_dir=backup_dir, keep=1)
+    elapsed = time.perf_counter() - start
+    done.set()
+    thread.join()
+
+    size_mb = os.path.getsize(path) / 1024 ** 2
+    stalls_ms = np.array(stalls) * 1000
+    print(f"Backed up {size_mb:.0f} MB in {elapsed:.1f}s ({size_mb / elapsed:.0f} MB/s)")
+    print(f"Writer commits during backup: {len(stalls)}")
+    if len(stalls):
+        print(f"Writer commit latency: median {np.median(stalls_ms):.1f}ms, "
+              f"p99 {np.percentile(stalls_ms, 99):.1f}ms, max {stalls_ms.max():.1f}ms")
+
+if __name__ == '__main__':
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else 'benchmark_ledger.db',
+              float(sys.argv[2]) if len(sys.argv) > 2 else 2.0)
@@ -1,10 +1,10 @@
 # File: expense_tracker/models.py
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 
 class TransactionType(Enum):
     EXPENSE = "expense"
@@ -20,6 +20,20 @@ class Category(Enum):
     INVESTMENT = "investment"
     OTHER = "other"
 
+@dataclass
+class Anomaly:
+    kind: str
+    score: float
+    detail: str
+    transaction_id: Optional[int] = None
+
+@dataclass
+class BudgetAlert:
+    category: Category
+    month: str
+    spent: Decimal
+    limit: Decimal
+
 @dataclass
 class Transaction:
     amount: Decimal
@@ -27,4 +41,8 @@ class Transaction:
     category: Category
     description: str
     date: datetime
-    id: Optional[int] = None
\ No newline at end of file
+    id: Optional[int] = None
+    balance: Optional[Decimal] = None
+    external_id: Optional[str] = None
+    anomalies: List[Anomaly] = field(default_factory=list)
+    budget_alert: Optional[BudgetAlert] = None
\ No newline at end of file
@@ -1,8 +1,16 @@
 # File: sheets_sync.py
+import hashlib
+import json
+import os
+from decimal import Decimal
+from typing import Callable, Iterator, List, Optional, Tuple
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from models import Transaction
 
+REBUILD_CHUNK_SIZE = 5000
+REBUILD_CHECKPOINT = 'sheet_rebuild.json'
+
 class GoogleSheetsSync:
     def __init__(self, spreadsheet_id: str):
         self.spreadsheet_id = spreadsheet_id
@@ -25,16 +33,19 @@ class GoogleSheetsSync:
             body={'values': headers}
         ).execute()
 
-    def sync_transaction(self, transaction: Transaction, running_balance: float):
-        """Sync a single transaction to Google Sheets"""
-        row = [[
+    def _row(self, transaction: Transaction, running_balance) -> list:
+        return [
             transaction.date.strftime('%Y-%m-%d %H:%M'),
             transaction.transaction_type.value,
             transaction.category.value,
             str(transaction.amount),
             transaction.description,
             str(running_balance)
-        ]]
+        ]
+
+    def sync_transaction(self, transaction: Transaction, running_balance: float):
+        """Sync a single transaction to Google Sheets"""
+        row = [self._row(transaction, running_balance)]
         
         self.service.spreadsheets().values().append(
             spreadsheetId=self.spreadsheet_id,
@@ -42,4 +53,85 @@ class GoogleSheetsSync:
             valueInputOption='RAW',
             insertDataOption='INSERT_ROWS',
             body={'values': row}
-        ).execute()
\ No newline at end of file
+        ).execute()
+
+    def sync_transactions(self, rows: List[Tuple[Transaction, Decimal]]):
+        """Append several transactions to Google Sheets in one request"""
+        self.service.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
+            range='A:F',
+            valueInputOption='RAW',
+            insertDataOption='INSERT_ROWS',
+            body={'values': [self._row(t, balance) for t, balance in rows]}
+        ).execute()
+
+    def _digest(self, rows: List[Tuple[Transaction, Decimal]]) -> str:
+        """Identify the exact rows being written, in order, so a resume never mixes two ledgers."""
+        digest = hashlib.sha256()
+        for transaction, balance in rows:
+            digest.update(f"{transaction.id}:{balance}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def rebuild(self, rows: List[Tuple[Transaction, Decimal]], resume: bool = False,
+                progress: Optional[Callable[[int, int], None]] = None,
+                chunk_size: int = REBUILD_CHUNK_SIZE,
+                checkpoint_path: str = REBUILD_CHECKPOINT) -> int:
+        """Replace every data row with `rows`, written in large chunks.
+
+        Progress is checkpointed after each chunk so an interrupted rebuild
+        can continue with resume=True instead of starting over. The rebuild
+        starts from scratch if the rows have changed since the checkpoint.
+        """
+        written = 0
+        for written, total in self.rebuild_steps(rows, resume, chunk_size, checkpoint_path):
+            if progress:
+                progress(written, total)
+        return written
+
+    def rebuild_steps(self, rows: List[Tuple[Transaction, Decimal]], resume: bool = False,
+                      chunk_size: int = REBUILD_CHUNK_SIZE,
+                      checkpoint_path: str = REBUILD_CHECKPOINT) -> Iterator[Tuple[int, int]]:
+        """Perform rebuild() one chunk per step, yielding (written, total) after each.
+
+        Every step makes at most three requests, so a caller can put a
+        timeout on each one.
+        """
+        total = len(rows)
+        digest = self._digest(rows)
+        written = 0
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if (checkpoint.get('spreadsheet_id') == self.spreadsheet_id and checkpoint.get('total') == total
+                    and checkpoint.get('digest') == digest):
+                written = checkpoint.get('written', 0)
+
+        if written == 0:
+            self.setup_spreadsheet()
+            self.service.spreadsheets().values().clear(
+                spreadsheetId=self.spreadsheet_id,
+                range='A2:F',
+                body={}
+            ).execute()
+        elif written >= total:
+            # Only the checkpoint cleanup was left to do.
+            yield written, total
+
+        while written < total:
+            chunk = rows[written:written + chunk_size]
+            first_row = written + 2
+            self.service.spreadsheets().values().update(
+                spreadsheetId=self.spreadsheet_id,
+                range=f'A{first_row}:F{first_row + len(chunk) - 1}',
+                valueInputOption='RAW',
+                body={'values': [self._row(t, balance) for t, balance in chunk]}
+            ).execute()
+            written += len(chunk)
+
+            with open(checkpoint_path, 'w') as f:
+                json.dump({'spreadsheet_id': self.spreadsheet_id, 'total': total, 'digest': digest,
+                           'written': written}, f)
+            yield written, total
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
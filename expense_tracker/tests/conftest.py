@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The modules import each other by bare name (`from models import ...`), as
+# they do when run from the expense_tracker directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from expense_tracker import ExpenseTracker
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = ExpenseTracker(db_path=str(tmp_path / "ledger.db"))
+    yield tracker
+    tracker.close()
@@ -0,0 +1,33 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from models import Transaction, TransactionType, Category
+
+
+def flagged(tracker):
+    return sorted(
+        (anomaly.transaction_id, anomaly.kind, round(anomaly.score, 6), anomaly.detail)
+        for anomaly, _ in tracker.get_anomalies(limit=1000)
+    )
+
+
+def test_backfill_reproduces_streaming_anomalies(tracker):
+    rng = random.Random(11)
+    start = datetime(2025, 1, 1, 8, 0)
+    for i in range(400):
+        amount = rng.uniform(5, 30) if rng.random() > 0.03 else rng.uniform(200, 900)
+        tracker.add_transaction(Transaction(
+            amount=Decimal(f"{amount:.2f}"),
+            transaction_type=TransactionType.EXPENSE,
+            category=rng.choice([Category.FOOD, Category.SHOPPING]),
+            description=f"purchase {i}",
+            date=start + timedelta(hours=6 * i)
+        ))
+
+    streamed = flagged(tracker)
+    assert any(kind == 'amount' for _, kind, _, _ in streamed)
+    assert all("(p99 $" in detail for _, kind, _, detail in streamed if kind == 'amount')
+
+    assert tracker.rebuild_anomaly_stats() == len(streamed)
+    assert flagged(tracker) == streamed
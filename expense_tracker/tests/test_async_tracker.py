@@ -0,0 +1,237 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from async_api import AsyncExpenseTracker, AsyncLLMProcessor, SheetSyncError
+from models import Transaction, TransactionType, Category
+from test_running_balance import FakeService, FakeValues, fake_sheets
+
+# cli reads the Mistral key at import time.
+os.environ.setdefault("KEY", "test")
+import cli
+
+
+class FakeLLM:
+    """Stands in for LLMProcessor; every call sleeps for `delay` seconds first."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def process_transaction_input(self, text):
+        self.calls += 1
+        time.sleep(self.delay)
+        return None
+
+    def suggest_category(self, description, transaction_type):
+        self.calls += 1
+        time.sleep(self.delay)
+        return Category.OTHER
+
+
+class FakeSheets:
+    """Stands in for GoogleSheetsSync and records every row pushed to it."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.synced = []
+        self.lock = threading.Lock()
+
+    def sync_transaction(self, transaction, running_balance):
+        time.sleep(self.delay)
+        with self.lock:
+            self.synced.append((transaction.id, running_balance))
+
+    def sync_transactions(self, rows):
+        for transaction, balance in rows:
+            self.sync_transaction(transaction, balance)
+
+
+def lunch(amount="12.50"):
+    return Transaction(
+        amount=Decimal(amount),
+        transaction_type=TransactionType.EXPENSE,
+        category=Category.FOOD,
+        description="Lunch at cafe",
+        date=datetime(2025, 3, 4, 12, 30)
+    )
+
+
+@pytest.fixture
+def shell(tmp_path, monkeypatch):
+    # The CLI keeps its database and classifier model in the working directory.
+    monkeypatch.chdir(tmp_path)
+    shell = cli.ExpenseTrackerCLI(api_key="test")
+    yield shell
+    shell.async_tracker.close()
+    shell.async_llm.close()
+    shell.tracker.close()
+    shell.loop.close()
+
+
+def test_cache_invalidated_by_local_write(tracker):
+    assert tracker.get_balance() == 0
+    assert tracker.get_balance() == 0
+    tracker.add_transaction(lunch())
+    assert tracker.get_balance() == Decimal("-12.50")
+
+    stats = tracker.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_cache_invalidated_by_another_process(tracker):
+    tracker.add_transaction(lunch())
+    assert len(tracker.get_transactions()) == 1
+    assert len(tracker.get_transactions()) == 1
+
+    script = (
+        "import sqlite3, sys\n"
+        "conn = sqlite3.connect(sys.argv[1])\n"
+        "conn.execute(\"INSERT INTO transactions (amount, transaction_type, category, description, date, balance) "
+        "VALUES ('5.00', 'expense', 'other', 'from elsewhere', '2025-03-05T09:00:00', 0)\")\n"
+        "conn.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", script, tracker.db_path], check=True)
+
+    assert [t.description for t in tracker.get_transactions()] == ["Lunch at cafe", "from elsewhere"]
+
+
+def test_cache_hit_rate(tracker):
+    assert tracker.cache_stats()["hit_rate"] == 0.0
+    for _ in range(4):
+        tracker.get_transactions()
+    tracker.get_balance()
+
+    stats = tracker.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (3, 2)
+    assert stats["hit_rate"] == pytest.approx(0.6)
+
+    tracker.invalidate_cache()
+    tracker.get_transactions()
+    assert tracker.cache_stats()["misses"] == 3
+
+
+def test_duplicate_add_is_not_pushed_to_sheets(tracker):
+    tracker.sheets_sync = FakeSheets()
+    async_tracker = AsyncExpenseTracker(tracker)
+
+    async def add_twice():
+        return [await async_tracker.add_transaction(lunch()) for _ in range(2)]
+
+    try:
+        first, second = asyncio.run(add_twice())
+    finally:
+        async_tracker.close()
+
+    assert first == second
+    assert tracker.sheets_sync.synced == [(first, Decimal("-12.50"))]
+    assert len(tracker.get_transactions()) == 1
+
+
+def test_sheets_timeout_after_commit_keeps_transaction(tracker):
+    tracker.sheets_sync = FakeSheets(delay=0.3)
+    async_tracker = AsyncExpenseTracker(tracker, timeout=0.05)
+
+    try:
+        with pytest.raises(SheetSyncError) as excinfo:
+            asyncio.run(async_tracker.add_transaction(lunch()))
+    finally:
+        async_tracker.close()
+
+    [stored] = tracker.get_transactions()
+    assert excinfo.value.transaction_id == stored.id
+
+
+def test_cli_reports_saved_transaction_when_sheets_times_out(shell, capsys):
+    shell.tracker.sheets_sync = FakeSheets(delay=0.3)
+    shell.async_tracker.timeout = 0.05
+
+    transaction_id = shell.run(shell._add_transaction(lunch()))
+
+    out = capsys.readouterr().out
+    assert "rebuild_sheet" in out
+    assert "Please try again" not in out
+    assert [t.id for t in shell.tracker.get_transactions()] == [transaction_id]
+
+
+def test_concurrent_quick_when_llm_times_out(shell, capsys):
+    llm = FakeLLM(delay=0.3)
+    shell.async_llm = AsyncLLMProcessor(llm, timeout=0.05)
+
+    async def two_quicks():
+        return await asyncio.gather(shell._quick("bought something for $20"), shell._quick("paid $35 somewhere"),
+                                    return_exceptions=True)
+
+    start = time.perf_counter()
+    results = shell.loop.run_until_complete(two_quicks())
+    elapsed = time.perf_counter() - start
+
+    assert all(isinstance(r, asyncio.TimeoutError) for r in results)
+    assert llm.calls == 2
+    assert elapsed < 0.3
+
+    shell.run(shell._quick("paid $15 for something"))
+    assert "timed out" in capsys.readouterr().out
+    assert shell.tracker.get_transactions() == []
+    # The SQLite thread is still free for the next command.
+    assert shell.run(shell.async_tracker.get_balance()) == 0
+
+
+def test_quick_parses_locally_only_when_unambiguous(shell):
+    for place in ["Lunch", "Lunch at cafe", "Lunch with team"]:
+        transaction = lunch()
+        transaction.description = place
+        shell.classifier.learn(transaction)
+
+    transaction = shell._parse_locally("Spent $25 on lunch today")
+    assert (transaction.amount, transaction.transaction_type) == (Decimal("25"), TransactionType.EXPENSE)
+    assert (transaction.category, transaction.description) == (Category.FOOD, "Lunch")
+
+    assert shell._parse_locally("Bought 2 coffees for lunch") is None
+    assert shell._parse_locally("paid salary to the cleaner $50 for lunch") is None
+    assert shell._parse_locally("lunch $12") is None
+    assert shell._parse_locally("Spent $1,200 on lunch") is None
+
+
+def test_rebuild_sheet_times_out_per_chunk_and_resumes(tracker, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for i in range(3):
+        tracker.add_transaction(lunch(f"{i + 1}.00"))
+    values = FakeValues(delay=0.3)
+    tracker.sheets_sync = fake_sheets(values)
+    async_tracker = AsyncExpenseTracker(tracker, timeout=0.05)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(async_tracker.rebuild_sheet())
+    finally:
+        async_tracker.close()
+    # The timed-out chunk still finished in the background and was checkpointed.
+    assert values.updates == ["A2:F4"]
+
+    tracker.sheets_sync.service = FakeService(FakeValues())
+    async_tracker = AsyncExpenseTracker(tracker)
+    try:
+        assert asyncio.run(async_tracker.rebuild_sheet(resume=True)) == 3
+    finally:
+        async_tracker.close()
+    assert not (tmp_path / "sheet_rebuild.json").exists()
+
+
+def test_dedupe_runs_through_the_async_tracker(shell, monkeypatch, capsys):
+    for external_id in ["card-1", "card-2"]:
+        transaction = lunch()
+        transaction.external_id = external_id
+        shell.tracker.add_transaction(transaction)
+    monkeypatch.setattr("builtins.input", lambda prompt: "y")
+
+    shell.do_dedupe("remove")
+
+    assert "Removed 1 duplicate transactions" in capsys.readouterr().out
+    assert len(shell.tracker.get_transactions()) == 1
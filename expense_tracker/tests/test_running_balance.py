@@ -0,0 +1,155 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from models import Transaction, TransactionType, Category
+from sheets_sync import GoogleSheetsSync
+
+
+def random_transaction(rng, i):
+    return Transaction(
+        amount=Decimal(rng.randint(1, 50000)) / 100,
+        transaction_type=TransactionType.INCOME if rng.random() < 0.3 else TransactionType.EXPENSE,
+        category=rng.choice(list(Category)),
+        description=f"transaction {i}",
+        date=datetime(2025, 1, 1) + timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+    )
+
+
+def signed(transaction):
+    if transaction.transaction_type == TransactionType.INCOME:
+        return transaction.amount
+    return -transaction.amount
+
+
+def brute_force_balances(ledger):
+    """Map each transaction id to the prefix sum of everything ordered before it."""
+    balances = {}
+    total = Decimal(0)
+    for t in sorted(ledger.values(), key=lambda t: (t.date, t.id)):
+        total += signed(t)
+        balances[t.id] = total
+    return balances
+
+
+def brute_force_balance_on(ledger, day):
+    return sum((signed(t) for t in ledger.values() if t.date.date() <= day), Decimal(0))
+
+
+def test_running_balances_match_brute_force(tracker):
+    rng = random.Random(42)
+    ledger = {}
+
+    # Single inserts arrive in random date order, so most are back-dated.
+    for i in range(200):
+        t = random_transaction(rng, i)
+        tracker.add_transaction(t)
+        ledger[t.id] = t
+
+    bulk = [random_transaction(rng, 200 + i) for i in range(150)]
+    tracker.add_transactions(bulk)
+    ledger.update({t.id: t for t in bulk})
+
+    removed = rng.sample(sorted(ledger), 40)
+    assert tracker.delete_transactions(removed) == len(removed)
+    for transaction_id in removed:
+        del ledger[transaction_id]
+
+    for i in range(50):
+        t = random_transaction(rng, 400 + i)
+        tracker.add_transaction(t)
+        ledger[t.id] = t
+
+    expected = brute_force_balances(ledger)
+    stored = {t.id: t.balance for t in tracker.get_transactions()}
+    assert stored == expected
+
+    assert tracker.get_balance() == sum((signed(t) for t in ledger.values()), Decimal(0))
+    for day in [date(2024, 12, 31)] + [date(2025, 1, 1) + timedelta(days=n) for n in range(0, 95, 3)]:
+        assert tracker.get_balance(as_of=day) == brute_force_balance_on(ledger, day)
+
+
+def test_running_balances_reused_for_sheet_rebuild(tracker):
+    rng = random.Random(7)
+    for i in range(30):
+        tracker.add_transaction(random_transaction(rng, i))
+
+    rows = tracker.get_running_balances()
+    assert [balance for _, balance in rows] == [t.balance for t in tracker.get_transactions()]
+    assert all(t.amount == t.amount.quantize(Decimal("0.01")) for t, _ in rows)
+    assert all(t.amount == t.amount.quantize(Decimal("0.01")) for t in tracker.get_transactions())
+
+
+class FakeValues:
+    """Records the ranges written through spreadsheets().values(), failing after `fail_after` updates."""
+
+    def __init__(self, fail_after=None, delay=0.0):
+        self.fail_after = fail_after
+        self.delay = delay
+        self.updates = []
+        self.clears = 0
+
+    def update(self, range, body, **kwargs):
+        if range != 'A1:F1':
+            if self.fail_after is not None and len(self.updates) >= self.fail_after:
+                raise ConnectionError("network down")
+            time.sleep(self.delay)
+            self.updates.append(range)
+        return self
+
+    def clear(self, **kwargs):
+        self.clears += 1
+        return self
+
+    def execute(self):
+        return {}
+
+
+class FakeService:
+    def __init__(self, values):
+        self._values = values
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self._values
+
+
+def fake_sheets(values):
+    sheets = GoogleSheetsSync.__new__(GoogleSheetsSync)
+    sheets.spreadsheet_id = "sheet"
+    sheets.service = FakeService(values)
+    return sheets
+
+
+def test_rebuild_resume_restarts_when_rows_changed(tracker, tmp_path):
+    rng = random.Random(3)
+    tracker.add_transactions([random_transaction(rng, i) for i in range(10)])
+    checkpoint = str(tmp_path / "rebuild.json")
+
+    failing = FakeValues(fail_after=2)
+    with pytest.raises(ConnectionError):
+        fake_sheets(failing).rebuild(tracker.get_running_balances(), chunk_size=3, checkpoint_path=checkpoint)
+
+    # Resuming with the same rows carries on after the written chunks.
+    values = FakeValues()
+    fake_sheets(values).rebuild(tracker.get_running_balances(), resume=True, chunk_size=3,
+                                checkpoint_path=checkpoint)
+    assert (values.clears, values.updates) == (0, ['A8:F10', 'A11:F11'])
+
+    with pytest.raises(ConnectionError):
+        fake_sheets(FakeValues(fail_after=2)).rebuild(tracker.get_running_balances(), chunk_size=3,
+                                                      checkpoint_path=checkpoint)
+
+    # One row removed and another added keeps the count but changes the rows.
+    tracker.delete_transactions([tracker.get_transactions()[0].id])
+    tracker.add_transaction(random_transaction(rng, 10))
+    values = FakeValues()
+    fake_sheets(values).rebuild(tracker.get_running_balances(), resume=True, chunk_size=3,
+                                checkpoint_path=checkpoint)
+    assert values.clears == 1
+    assert values.updates[0] == 'A2:F4'